@@ -1,10 +1,26 @@
 #!/usr/bin/env python3
+import argparse
+import io
 import json
-import math
+import os
 import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from operator import itemgetter
 from pathlib import Path
 from urllib.parse import quote
 
+try:
+  import ahocorasick
+except ImportError:
+  ahocorasick = None
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
 # Categorías "fila" (pocas y usables)
 CANON = [
   ("general", "En directo · Generalistas"),
@@ -18,38 +34,143 @@ CANON = [
   ("other", "En directo · Otros"),
 ]
 
+# Palabras clave por categoría, en orden de prioridad (gana la primera que aparezca)
+KEYWORDS = [
+  ("events", ["event", "pass", "ppv", "multipantalla"]),
+  ("sports", ["deport", "sport"]),
+  ("news", ["noticia", "news", "econom"]),
+  ("movies", ["cine", "movie", "series", "hbo", "showtime", "cinemax", "max"]),
+  ("ent", ["entreten", "entertainment", "cable"]),
+  ("docs", ["document", "history", "discovery", "nat geo", "travel", "tlc"]),
+  ("kids", ["infantil", "kids", "disney", "nick"]),
+  ("general", ["general", "abierta", "generalista"]),
+]
+
+# Una sola regex: cada rama es un lookahead, así se respeta la prioridad de KEYWORDS
+# y no la posición del match; lastgroup devuelve la categoría.
+CAT_RE = re.compile("|".join(
+  f"(?=.*?(?:{'|'.join(map(re.escape, kws))}))(?P<{cid}>)" for cid, kws in KEYWORDS
+), re.DOTALL)
+
+_NONWORD = re.compile(r"[^\w\s-]")
+
+# Vía rápida ASCII para slugify: borra lo que no sea [\w\s-] y pasa "_"/"-" a espacio,
+# así split() + join colapsan los separadores sin regex.
+_ASCII_SLUG = str.maketrans({
+  chr(c): (" " if chr(c) in "_-" else None)
+  for c in range(128)
+  if chr(c) in "_-" or not (chr(c).isalnum() or chr(c).isspace())
+})
+_SEP_SPACE = str.maketrans("_-", "  ")
+
+# Autómata Aho-Corasick (opcional): una pasada por cadena. Cada palabra guarda
+# (prioridad, categoría) y nos quedamos con la de menor prioridad encontrada.
+CAT_AC = None
+if ahocorasick is not None:
+  CAT_AC = ahocorasick.Automaton()
+  for prio, (cid, kws) in enumerate(KEYWORDS):
+    for kw in kws:
+      CAT_AC.add_word(kw, (prio, cid))
+  CAT_AC.make_automaton()
+
 def canon_category(raw: str) -> str:
   s = (raw or "").strip().lower()
-  if any(k in s for k in ["event", "pass", "ppv", "multipantalla"]): return "events"
-  if any(k in s for k in ["deport", "sport"]): return "sports"
-  if any(k in s for k in ["noticia", "news", "econom"]): return "news"
-  if any(k in s for k in ["cine", "movie", "series", "hbo", "showtime", "cinemax", "max"]): return "movies"
-  if any(k in s for k in ["entreten", "entertainment", "cable"]): return "ent"
-  if any(k in s for k in ["document", "history", "discovery", "nat geo", "travel", "tlc"]): return "docs"
-  if any(k in s for k in ["infantil", "kids", "disney", "nick"]): return "kids"
-  if any(k in s for k in ["general", "abierta", "generalista"]): return "general"
-  return "other"
+  if CAT_AC is not None:
+    best = min((v for _, v in CAT_AC.iter(s)), default=None)
+    return best[1] if best else "other"
+  m = CAT_RE.match(s)
+  return m.lastgroup if m else "other"
 
 def slugify(s: str) -> str:
   s = (s or "").strip().lower()
-  s = re.sub(r"[^\w\s-]", "", s)
-  s = re.sub(r"[\s_-]+", "-", s).strip("-")
-  return s or "item"
+  if s.isascii():
+    s = s.translate(_ASCII_SLUG)
+  else:
+    s = _NONWORD.sub("", s).translate(_SEP_SPACE)
+  return "-".join(s.split()) or "item"
+
+# Encoder reutilizado en el fallback sin orjson (json.dumps crea uno por llamada)
+_ENC = json.JSONEncoder(ensure_ascii=False, indent=2, separators=(",", ": ")).encode
+
+def dump_json(obj) -> bytes:
+  if orjson is not None:
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+  return _ENC(obj).encode("utf-8")
+
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+
+def _unchanged(path_str: str, data: bytes) -> bool:
+  # Compara con lo que ya hay en disco (builds incrementales): mismo tamaño y mismos bytes
+  try:
+    fd = os.open(path_str, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+  except FileNotFoundError:
+    return False
+  try:
+    return os.fstat(fd).st_size == len(data) and os.read(fd, len(data)) == data
+  finally:
+    os.close(fd)
+
+# Con --zip, main abre aquí un ZipFile en memoria y todas las escrituras van a él
+_zip = None
+
+def _raw_write(path_str: str, data: bytes):
+  if _zip is not None:
+    _zip.writestr(path_str.replace(os.sep, "/"), data)
+    return
+  if _unchanged(path_str, data): return
+  # Directo sobre el descriptor: sin BufferedWriter para ficheros de pocos KB
+  fd = os.open(path_str, _OPEN_FLAGS, 0o644)
+  try:
+    view = memoryview(data)
+    while view:
+      view = view[os.write(fd, view):]
+  finally:
+    os.close(fd)
+
+def write_json_nomkdir(p: Path, obj):
+  # Sin mkdir: main crea el árbol de directorios antes de los bucles de escritura.
+  # Serializa entero y escribe de una vez: json.dump con indent va trozo a trozo
+  # contra el fichero y es más lento para catálogos de 100 metas.
+  _raw_write(str(p), dump_json(obj))
 
 def write_json(p: Path, obj):
-  p.parent.mkdir(parents=True, exist_ok=True)
-  p.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+  if _zip is None: p.parent.mkdir(parents=True, exist_ok=True)
+  write_json_nomkdir(p, obj)
+
+# Página vacía ya serializada: el centinela final y muchos filtros por país
+_EMPTY = dump_json({"metas": []})
 
-def paginate(base_file: Path, base_dir: Path, metas):
+def paginate(base_file: Path, base_dir: Path, metas, write=_raw_write):
+  # write(path_str, data): main pasa uno que encola la escritura en un pool de hilos
   page = 100
-  write_json(base_file, {"metas": metas[:page]})
-  total = len(metas)
-  for skip in range(page, total, page):
-    write_json(base_dir / f"skip={skip}.json", {"metas": metas[skip:skip+page]})
-  terminal_skip = int(math.ceil(max(total, 1) / page) * page)
-  write_json(base_dir / f"skip={terminal_skip}.json", {"metas": []})
+  n = len(metas)
+  if not n:
+    write(str(base_file), _EMPTY)
+  for skip in range(0, n, page):
+    p = base_file if skip == 0 else base_dir / f"skip={skip}.json"
+    write(str(p), dump_json({"metas": metas[skip:skip+page]}))
+  # Centinela vacío tras la última página (skip=100 también si no hay metas)
+  pages, rem = divmod(n, page)
+  terminal_skip = (pages + (1 if rem or n == 0 else 0)) * page
+  write(str(base_dir / f"skip={terminal_skip}.json"), _EMPTY)
+
+def write_channel_files(x, out_str):
+  out = Path(out_str)
+  # Parte de la meta de catálogo (ya lleva poster si hay logo) y añade lo propio del detalle
+  meta = dict(x["meta"], description=x["desc"] or x["country"])
+  if x["logo"]: meta["logo"] = x["logo"]
+  write_json_nomkdir(out / "meta" / "tv" / f'{x["id"]}.json', {"meta": meta})
+
+  write_json_nomkdir(out / "stream" / "tv" / f'{x["id"]}.json', {
+    "streams": [{"title": "Directo (HLS)", "url": x["url"]}]
+  })
 
 def main():
+  global _zip
+  ap = argparse.ArgumentParser(description="Genera el addon estático en docs/")
+  ap.add_argument("--zip", metavar="FICHERO", help="escribe todo en un .zip (deflate nivel 1) en vez de en docs/")
+  args = ap.parse_args()
+
   channels = json.loads(Path("channels.json").read_text(encoding="utf-8"))
   if isinstance(channels, dict): channels = channels.get("channels", [])
   if not isinstance(channels, list): raise SystemExit("channels.json debe ser array o {channels:[...]}")
@@ -61,6 +182,8 @@ def main():
   norm = []
   countries = set()
   skipped = 0
+  # Mapeo categórico: las categorías crudas se repiten mucho, se resuelve cada una una vez
+  cat_of = {}
 
   def pick_str(*vals) -> str:
     for v in vals:
@@ -101,49 +224,44 @@ def main():
 
     country = pick_str(ch.get("country"), ch.get("cc"), ch.get("countryCode")).upper() or "XX"
     raw_cat = pick_str(ch.get("category"), ch.get("group"), ch.get("type")) or "other"
-    cat = canon_category(raw_cat)
+    cat = cat_of.get(raw_cat)
+    if cat is None: cat = cat_of[raw_cat] = canon_category(raw_cat)
 
     cid = ch.get("id") or f"{country.lower()}_{slugify(name)}"
     cid = prefix + slugify(str(cid)).replace(prefix, "", 1)
 
     countries.add(country)
 
+    logo = pick_str(ch.get("logo"), ch.get("poster"), ch.get("icon"))
+    # Meta de catálogo: cada canal está en una sola categoría, se construye aquí una vez
+    meta = {"type": "tv", "id": cid, "name": name, "genres": [country], "posterShape": "square"}
+    if logo: meta["poster"] = logo
+
     norm.append({
       "id": cid,
       "name": name,
+      "name_lc": name.lower(),
       "country": country,
       "cat": cat,
-      "logo": pick_str(ch.get("logo"), ch.get("poster"), ch.get("icon")),
+      "logo": logo,
       "desc": pick_str(ch.get("description"), ch.get("desc")),
-      "url": url
+      "url": url,
+      "meta": meta
     })
 
   print(f"channels.json entries: {len(channels)} | parsed: {len(norm)} | skipped: {skipped}")
   if len(norm) == 0:
     raise SystemExit("No se parseó ningún canal. Revisa las claves (name/title y url/streams[0].url).")
 
-    country = (ch.get("country") or "xx").strip().lower()
-    country = country[:2] if len(country) >= 2 else "xx"
-    countries.add(country.upper())
-
-    raw_cat = ch.get("category") or ch.get("group") or "other"
-    cat = canon_category(str(raw_cat))
-
-    cid = ch.get("id") or f"{country}_{slugify(name)}"
-    cid = prefix + slugify(str(cid)).replace(prefix, "", 1)
+  countries_sorted = tuple(sorted(countries))
+  # El país viene tal cual del JSON (no siempre es [A-Z]{2}): se escapa una vez por país
+  genre_keys = tuple((ctry, f"genre={quote(ctry)}") for ctry in countries_sorted)
 
-    norm.append({
-      "id": cid,
-      "name": name,
-      "country": country.upper(),
-      "cat": cat,
-      "logo": (ch.get("logo") or ch.get("poster") or "").strip(),
-      "desc": (ch.get("description") or "").strip(),
-      "url": url
-    })
-
-  used = sorted(set(x["cat"] for x in norm))
-  catalogs = [c for c in CANON if c[0] in used]
+  # Agrupa por categoría en una sola pasada
+  buckets = {}
+  for x in norm:
+    buckets.setdefault(x["cat"], []).append(x)
+  catalogs = [c for c in CANON if c[0] in buckets]
 
   manifest = {
     "id": "com.tuusuario.live",
@@ -165,52 +283,65 @@ def main():
       "id": f"live_{cat_id}",
       "name": cat_name,
       "extra": [{"name": "genre"}, {"name": "skip"}],
-      "genres": sorted(countries)
+      "genres": countries_sorted
     })
 
+  if args.zip:
+    zip_buf = io.BytesIO()
+    _zip = zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
+  else:
+    # Crea el árbol de directorios una sola vez; los escritores de abajo no hacen mkdir
+    for d in (out / "meta" / "tv", out / "stream" / "tv"):
+      d.mkdir(parents=True, exist_ok=True)
+    for cat_id, _ in catalogs:
+      for _, genre in genre_keys:
+        (out / "catalog" / "tv" / f"live_{cat_id}" / genre).mkdir(parents=True, exist_ok=True)
+
   write_json(out / "manifest.json", manifest)
-  (out / ".nojekyll").write_text("", encoding="utf-8")
-
-  # Genera catálogos
-  for cat_id, _ in catalogs:
-    catalog_id = f"live_{cat_id}"
-    cat_channels = [x for x in norm if x["cat"] == cat_id]
-    cat_channels.sort(key=lambda x: (x["country"], x["name"].lower()))
-
-    metas = []
-    for x in cat_channels:
-      m = {"type": "tv", "id": x["id"], "name": x["name"], "genres": [x["country"]], "posterShape": "square"}
-      if x["logo"]: m["poster"] = x["logo"]
-      metas.append(m)
-
-    base_file = out / "catalog" / "tv" / f"{catalog_id}.json"
-    base_dir = out / "catalog" / "tv" / catalog_id
-    paginate(base_file, base_dir, metas)
-
-    # Filtrado por país (genre=XX)
-    for ctry in sorted(countries):
-      filtered = [m for m in metas if ctry in (m.get("genres") or [])]
-      genre_file = base_dir / f"genre={quote(ctry)}.json"
-      genre_dir  = base_dir / f"genre={quote(ctry)}"
-      paginate(genre_file, genre_dir, filtered)
-
-  # Meta + Stream por canal
-  for x in norm:
-    meta = {
-      "meta": {
-        "id": x["id"], "type": "tv", "name": x["name"],
-        "genres": [x["country"]], "posterShape": "square",
-        "description": x["desc"] or f'{x["country"]}'
-      }
-    }
-    if x["logo"]:
-      meta["meta"]["poster"] = x["logo"]
-      meta["meta"]["logo"] = x["logo"]
-    write_json(out / "meta" / "tv" / f'{x["id"]}.json', meta)
-
-    write_json(out / "stream" / "tv" / f'{x["id"]}.json', {
-      "streams": [{"title": "Directo (HLS)", "url": x["url"]}]
-    })
+  _raw_write(str(out / ".nojekyll"), b"")
+
+  # Genera catálogos: se serializa en este hilo y la escritura va a un pool de hilos
+  # (os.open/os.write sueltan el GIL). Pocos hilos para acotar descriptores abiertos;
+  # con --zip uno solo, porque ZipFile no admite escrituras concurrentes.
+  with ThreadPoolExecutor(max_workers=1 if _zip is not None else 8) as io_pool:
+    pending = []
+    def write(path_str, data):
+      pending.append(io_pool.submit(_raw_write, path_str, data))
+
+    for cat_id, _ in catalogs:
+      catalog_id = f"live_{cat_id}"
+      cat_channels = buckets[cat_id]
+      cat_channels.sort(key=itemgetter("country", "name_lc"))
+
+      metas = list(map(itemgetter("meta"), cat_channels))
+
+      base_file = out / "catalog" / "tv" / f"{catalog_id}.json"
+      base_dir = out / "catalog" / "tv" / catalog_id
+      paginate(base_file, base_dir, metas, write)
+
+      # Filtrado por país (genre=XX): cada meta tiene un único país, se agrupa en una pasada
+      by_country = {}
+      for m in metas:
+        by_country.setdefault(m["genres"][0], []).append(m)
+      for ctry, genre in genre_keys:
+        filtered = by_country.get(ctry, [])
+        genre_file = base_dir / f"{genre}.json"
+        genre_dir  = base_dir / genre
+        paginate(genre_file, genre_dir, filtered, write)
+    for f in pending: f.result()
+
+  # Meta + Stream por canal (ficheros independientes, se reparten entre procesos)
+  if _zip is not None:
+    # El ZipFile vive en este proceso: aquí se escribe en serie y se vuelca una sola vez
+    for x in norm:
+      write_channel_files(x, str(out))
+    _zip.close()
+    _zip = None
+    Path(args.zip).write_bytes(zip_buf.getvalue())
+    return
+
+  with ProcessPoolExecutor() as ex:
+    list(ex.map(write_channel_files, norm, repeat(str(out)), chunksize=64))
 
 if __name__ == "__main__":
   main()